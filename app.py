@@ -6,9 +6,9 @@
 # AGORA: os horários encadeados são SALVOS de volta no session_state.
 
 from __future__ import annotations
-import time
-from datetime import datetime, date, time as dtime, timedelta
-from zoneinfo import ZoneInfo
+import re
+from html import escape
+from datetime import datetime, date, time as dtime, timedelta, timezone
 
 import pandas as pd
 import numpy as np
@@ -16,8 +16,12 @@ import streamlit as st
 
 # ---------------- Config ----------------
 st.set_page_config(page_title="BTZ | Cronograma de Pista", page_icon="🗓️", layout="wide")
-TZINFO = ZoneInfo("America/Sao_Paulo")   # sempre Brasília
+# Brasília como offset fixo -03:00: o Brasil aboliu o horário de verão em 2019, então não há
+# transições a consultar (ZoneInfo faria uma busca na tabela a cada now()/tz_localize).
+TZINFO = timezone(timedelta(hours=-3), "America/Sao_Paulo")   # sempre Brasília
 GAP = timedelta(minutes=1)               # GAP FIXO entre atividades encadeadas
+NS = 1_000_000_000                       # ns por segundo (Start/End em int64 ns)
+OFFSET_NS = int(TZINFO.utcoffset(None).total_seconds()) * NS   # -03:00 em ns (local = UTC + OFFSET_NS)
 
 STATUS_DONE = "Concluída"
 STATUS_RUNNING = "Em execução"
@@ -30,7 +34,8 @@ COLOR_NEXT = "#f9e79f"
 COLOR_FUTURE = "#ecf0f1"
 
 # --------- CSS/JS: painel rolável da tabela + preservação do scroll ---------
-st.markdown("""
+# Constante de módulo; fica fora do fragmento de 1s, então só é reenviada em reruns completos.
+PAGE_CSS_JS = """
 <style>
 .btz-table-panel {
   max-height: 65vh;
@@ -41,6 +46,14 @@ st.markdown("""
   background: #0b0f19;
 }
 .btz-table-panel table thead th { position: sticky; top: 0; z-index: 2; }
+.btz-table {
+  border-collapse: separate;
+  border-spacing: 0;
+  width: 100%;
+  font-family: Inter, system-ui, -apple-system, Segoe UI, Roboto, Arial;
+}
+.btz-table th { background: #111827; color: white; padding: 10px 8px; text-align: left; }
+.btz-table td { padding: 10px 8px; border-bottom: 1px solid #e5e7eb; font-size: 0.95rem; }
 .stProgress > div > div { height: 10px; }
 </style>
 <script>
@@ -48,99 +61,133 @@ st.markdown("""
   const KEY="btz_scrollY";
   const restore=()=>{const y=sessionStorage.getItem(KEY); if(y!==null) window.scrollTo(0, parseFloat(y));};
   const save=()=>sessionStorage.setItem(KEY, window.scrollY);
-  setInterval(save, 300); restore();
+  window.addEventListener("scroll", save, {passive: true}); restore();
 })();
 </script>
-""", unsafe_allow_html=True)
+"""
+st.markdown(PAGE_CSS_JS, unsafe_allow_html=True)
 
 # ---------------- Helpers ----------------
 def now_br() -> datetime:
     return datetime.now(TZINFO)
 
-def parse_time_str(s: str) -> dtime | None:
-    s = (s or "").strip()
-    for fmt in ("%H:%M:%S", "%H:%M"):
-        try:
-            return datetime.strptime(s, fmt).time()
-        except ValueError:
-            pass
-    return None
+_TIME_RE = re.compile(r"^([0-9]{1,2}):([0-9]{1,2})(?::([0-9]{1,2}))?$")   # HH:MM[:SS]
 
-def parse_duration_hms(s: str) -> timedelta | None:
-    """Aceita 'HH:MM:SS' ou 'MM:SS' -> timedelta."""
-    s = (s or "").strip()
-    try:
-        parts = [int(p) for p in s.split(":")]
-        if len(parts) == 2:
-            m, s = parts
-            if m < 0 or not (0 <= s < 60): return None
-            return timedelta(minutes=m, seconds=s)
-        elif len(parts) == 3:
-            h, m, s = parts
-            if h < 0 or m < 0 or not (0 <= s < 60): return None
-            return timedelta(hours=h, minutes=m, seconds=s)
+def parse_time_str(s: str) -> dtime | None:
+    m = _TIME_RE.match((s or "").strip())
+    if not m:
         return None
-    except Exception:
+    h, mi, se = int(m[1]), int(m[2]), int(m[3] or 0)
+    if h > 23 or mi > 59 or se > 59:
         return None
+    return dtime(h, mi, se)
 
-def duration_to_hms(td: timedelta) -> str:
-    total = max(0, int(td.total_seconds()))
-    h, rem = divmod(total, 3600)
-    m, s = divmod(rem, 60)
-    return f"{h:02d}:{m:02d}:{s:02d}"
+def parse_local_datetimes(s: pd.Series) -> pd.Series:
+    """
+    'YYYY-MM-DD HH:MM:SS' (ou 'YYYY-MM-DD HH:MM') -> datetime64 ingênuo.
+    Formato explícito: o pandas não precisa inferir o formato elemento a elemento.
+    """
+    out = pd.to_datetime(s, format="%Y-%m-%d %H:%M:%S", errors="coerce")
+    miss = out.isna()
+    if miss.any():
+        out[miss] = pd.to_datetime(s[miss], format="%Y-%m-%d %H:%M", errors="coerce")
+    return out
 
-def human_td(td: timedelta) -> str:
-    sign = "-" if td.total_seconds() < 0 else ""
-    td = abs(td)
-    h, rem = divmod(int(td.total_seconds()), 3600)
+_DURATION_RE = re.compile(r"^([0-9]+):([0-9]+)(?::([0-9]+))?$")   # MM:SS ou HH:MM:SS
+
+def parse_duration_hms(s: str) -> timedelta | None:
+    """Aceita 'HH:MM:SS' ou 'MM:SS' -> timedelta."""
+    m = _DURATION_RE.match((s or "").strip())
+    if not m:
+        return None
+    a, b, c = m.groups()
+    if c is None:
+        if int(b) >= 60: return None
+        return timedelta(minutes=int(a), seconds=int(b))
+    if int(c) >= 60: return None
+    return timedelta(hours=int(a), minutes=int(b), seconds=int(c))
+
+def durations_to_hms(secs) -> list[str]:
+    """Formata uma coluna inteira de segundos como HH:MM:SS (negativos viram 00:00:00)."""
+    total = np.clip(np.asarray(secs, dtype=np.int64), 0, None)
+    h, rem = np.divmod(total, 3600)
+    m, s = np.divmod(rem, 60)
+    return [f"{hh:02d}:{mm:02d}:{ss:02d}" for hh, mm, ss in zip(h.tolist(), m.tolist(), s.tolist())]
+
+def human_secs(secs: int) -> str:
+    sign = "-" if secs < 0 else ""
+    h, rem = divmod(abs(int(secs)), 3600)
     m, s = divmod(rem, 60)
     return f"{sign}{h:02d}:{m:02d}:{s:02d}" if h else f"{sign}{m:02d}:{s:02d}"
 
-def classify_rows(df: pd.DataFrame, now: datetime) -> pd.DataFrame:
-    def _stat(r):
-        if r.End <= now: return STATUS_DONE
-        if r.Start <= now < r.End: return STATUS_RUNNING
-        return STATUS_UPCOMING
-    df["Status"] = df.apply(_stat, axis=1)
-    fut = df.index[df["Status"] == STATUS_UPCOMING].tolist()
-    if fut:
-        df.loc[fut[0], "Status"] = STATUS_NEXT
+def locate_now(start_ns: np.ndarray, end_ns: np.ndarray, now_ns: int) -> tuple[int, int]:
+    """
+    Busca binária nos arrays ordenados -> (i_done, i_next):
+    [0, i_done) concluídas, [i_done, i_next) em execução, i_next é a próxima (se existir).
+    Só vale com intervalos crescentes e sem sobreposição (ver _store_view).
+    """
+    return (int(np.searchsorted(end_ns, now_ns, side="right")),
+            int(np.searchsorted(start_ns, now_ns, side="right")))
+
+def status_masks(start_ns: np.ndarray, end_ns: np.ndarray, now_ns: int) -> tuple[np.ndarray, np.ndarray, int]:
+    """
+    Caminho geral (intervalos fora de ordem/sobrepostos) -> (done, running, i_next):
+    máscaras de concluídas/em execução e a primeira linha ainda não iniciada (len se não houver).
+    """
+    done = end_ns <= now_ns
+    started = start_ns <= now_ns
+    i_next = int(np.argmax(~started)) if not started.all() else len(started)
+    return done, started & ~done, i_next
+
+def classify_rows(df: pd.DataFrame, done, running, i_next: int) -> pd.DataFrame:
+    """Status a partir de seletores (fatias de locate_now ou máscaras de status_masks)."""
+    status = np.full(len(df), STATUS_UPCOMING, dtype=object)
+    status[done] = STATUS_DONE
+    status[running] = STATUS_RUNNING
+    if i_next < len(df):
+        status[i_next] = STATUS_NEXT
+    df["Status"] = status
     return df
 
 def style_table(df: pd.DataFrame) -> str:
     preferred = ["Data","Início","Fim","Duração","Atividade","Status"]
     cols = [c for c in preferred if c in df.columns]
-    view = df[cols].copy()
-
-    def row_style(row):
-        val = row.get("Status", "")
-        if val == STATUS_RUNNING: return [f"background-color:{COLOR_RUNNING}; color:#0b5345;"]*len(row)
-        if val == STATUS_DONE:    return [f"background-color:{COLOR_PAST}; color:#1b4f72;"]*len(row)
-        if val == STATUS_NEXT:    return [f"background-color:{COLOR_NEXT}; color:#7d6608;"]*len(row)
-        return [f"background-color:{COLOR_FUTURE}; color:#2c3e50;"]*len(row)
-
-    styler = (view.style.apply(row_style, axis=1)
-                    .hide(axis="index")
-                    .set_table_styles([
-                        {"selector":"table","props":[("border-collapse","separate"),("border-spacing","0"),("width","100%"),("font-family","Inter, system-ui, -apple-system, Segoe UI, Roboto, Arial")]},
-                        {"selector":"th","props":[("background","#111827"),("color","white"),("position","sticky"),
-                                                  ("top","0"),("z-index","2"),("padding","10px 8px"),("text-align","left")]},
-                        {"selector":"td","props":[("padding","10px 8px"),("border-bottom","1px solid #e5e7eb")]}
-                    ])
-                    .set_properties(**{"font-size":"0.95rem"}))
-    return styler.to_html()
+    # chave hashável (colunas + linhas visíveis): sem mudança de status, o HTML vem do cache
+    rows = tuple(zip(*(df[c].tolist() for c in cols)))   # sem df[cols]: evita copiar o frame
+    return _render_table_html(tuple(cols), rows)
+
+ROW_STYLE = {
+    STATUS_RUNNING:  f"background-color:{COLOR_RUNNING}; color:#0b5345;",
+    STATUS_DONE:     f"background-color:{COLOR_PAST}; color:#1b4f72;",
+    STATUS_NEXT:     f"background-color:{COLOR_NEXT}; color:#7d6608;",
+    STATUS_UPCOMING: f"background-color:{COLOR_FUTURE}; color:#2c3e50;",
+}
+
+@st.cache_data(show_spinner=False, max_entries=32)
+def _render_table_html(cols: tuple[str, ...], rows: tuple[tuple, ...]) -> str:
+    """HTML montado direto em string (sem pandas Styler); estilos fixos ficam em PAGE_CSS_JS."""
+    i_status = cols.index("Status") if "Status" in cols else None
+    head = "".join(f"<th>{escape(c)}</th>" for c in cols)
+    body = "".join(
+        f'<tr style="{ROW_STYLE.get(r[i_status] if i_status is not None else None, ROW_STYLE[STATUS_UPCOMING])}">'
+        + "".join(f"<td>{escape(str(v))}</td>" for v in r) + "</tr>"
+        for r in rows
+    )
+    return f'<table class="btz-table"><thead><tr>{head}</tr></thead><tbody>{body}</tbody></table>'
+
+TASK_COLS = ["Date","Start","DurationSec","Activity"]
 
 def ensure_state():
-    # Armazenamos: Date (iso), Start (HH:MM:SS), DurationSec (int), Activity (str)
+    # Armazenamos em colunas (SoA, listas paralelas):
+    # Date (iso), Start (HH:MM:SS), DurationSec (int), Activity (str)
     if "tasks" not in st.session_state:
-        st.session_state.tasks = []
+        st.session_state.tasks = {c: [] for c in TASK_COLS}
+    # incrementado a cada gravação das tarefas; é a chave da visão em cache
+    if "tasks_version" not in st.session_state:
+        st.session_state.tasks_version = 0
 
-def _safe_int(x, default=0):
-    try:
-        if pd.isna(x): return default
-        return int(x)
-    except Exception:
-        return default
+def task_count() -> int:
+    return len(st.session_state.tasks["Date"])
 
 def normalize_tasks(df_raw: pd.DataFrame) -> pd.DataFrame:
     """
@@ -158,8 +205,8 @@ def normalize_tasks(df_raw: pd.DataFrame) -> pd.DataFrame:
     if "DurationSec" not in out.columns or out["DurationSec"].isna().all():
         if "End" in out.columns:
             try:
-                start_dt = pd.to_datetime(out["Date"].astype(str) + " " + out["Start"].astype(str), errors="coerce")
-                end_dt   = pd.to_datetime(out["Date"].astype(str) + " " + out["End"].astype(str), errors="coerce")
+                start_dt = parse_local_datetimes(out["Date"].astype(str) + " " + out["Start"].astype(str))
+                end_dt   = parse_local_datetimes(out["Date"].astype(str) + " " + out["End"].astype(str))
                 dur = (end_dt - start_dt).dt.total_seconds().fillna(0).astype(int).clip(lower=0)
                 out["DurationSec"] = dur
             except Exception:
@@ -167,59 +214,145 @@ def normalize_tasks(df_raw: pd.DataFrame) -> pd.DataFrame:
         else:
             out["DurationSec"] = 0
     else:
-        out["DurationSec"] = out["DurationSec"].apply(_safe_int)
+        out["DurationSec"] = (pd.to_numeric(out["DurationSec"], errors="coerce")
+                              .fillna(0).clip(lower=0).astype("int64"))
 
     out["Date"] = out["Date"].astype(str)
     out["Start"] = out["Start"].astype(str)
     out["Activity"] = out["Activity"].astype(str)
     return out[["Date","Start","DurationSec","Activity"]]
 
+def validate_edited_rows(edited: pd.DataFrame) -> tuple[dict[str, list], list[str]]:
+    """
+    Valida as linhas do editor coluna a coluna (sem loop por linha).
+    Retorna (tarefas em colunas, erros); cada linha reporta só o primeiro problema encontrado.
+    """
+    def col(name: str) -> pd.Series:
+        if name not in edited.columns:
+            return pd.Series("", index=edited.index)
+        return edited[name].astype(str).str.strip()
+
+    dates, starts, durs, acts = col("Date"), col("Start"), col("Duration"), col("Activity")
+    empty = dates.eq("") | starts.eq("") | durs.eq("") | acts.eq("")
+
+    d_parsed = pd.to_datetime(dates, format="%Y-%m-%d", errors="coerce")
+
+    # 'HH:MM:SS' ou 'HH:MM' (mesmas regras de parse_time_str)
+    hms = starts.str.extract(_TIME_RE.pattern).astype(float)
+    hms[2] = hms[2].fillna(0)
+    bad_start = hms[0].isna() | ~((hms[0] < 24) & (hms[1] < 60) & (hms[2] < 60))
+    start_fmt = hms.fillna(0).astype("int64").astype(str).apply(lambda c: c.str.zfill(2))
+
+    # 'HH:MM:SS' ou 'MM:SS' (mesmas regras de parse_duration_hms)
+    parts = durs.str.extract(_DURATION_RE.pattern).astype(float)
+    a, b, c = parts[0], parts[1], parts[2]
+    three = c.notna()
+    secs = (a * 3600 + b * 60 + c).where(three, a * 60 + b)
+    bad_dur = a.isna() | ~(c.where(three, b) < 60)
+
+    reason = np.select(
+        [empty.to_numpy(), d_parsed.isna().to_numpy(), bad_start.to_numpy(), bad_dur.to_numpy()],
+        ["campos vazios.", "Date inválida (use YYYY-MM-DD).",
+         "Início inválido (use HH:MM:SS).", "Duração inválida (use HH:MM:SS ou MM:SS)."],
+        default="",
+    )
+    bad = reason != ""
+    errors = [f"Linha {i}: {r}" for i, r in zip(edited.index[bad], reason[bad])]
+
+    ok = ~bad
+    tasks = pd.DataFrame({
+        "Date": d_parsed[ok].dt.strftime("%Y-%m-%d"),
+        "Start": (start_fmt[0] + ":" + start_fmt[1] + ":" + start_fmt[2])[ok],
+        "DurationSec": secs[ok].astype("int64"),
+        "Activity": acts[ok],
+    }).to_dict(orient="list")
+    return tasks, errors
+
 def compute_schedule(df_raw: pd.DataFrame) -> pd.DataFrame:
     """Monta Start/End reais (com TZ) e aplica encadeamento com GAP dentro de cada data."""
     base = normalize_tasks(df_raw)
     if base.empty:
         return pd.DataFrame(columns=["Date","Start","End","DurationSec","Activity"])
 
-    base["Date"] = pd.to_datetime(base["Date"], errors="coerce").dt.date
-    base["Start_dt"] = pd.to_datetime(base["Date"].astype(str) + " " + base["Start"].astype(str),
-                                      errors="coerce").dt.tz_localize(TZINFO, nonexistent="shift_forward")
-
-    base = base.dropna(subset=["Date","Start_dt"]).sort_values(["Date","Start_dt"]).reset_index(drop=True)
-
-    prev_end_by_day: dict[date, datetime] = {}
-    starts, ends = [], []
-    for _, row in base.iterrows():
-        d = row["Date"]
-        st_dt: datetime = row["Start_dt"]
-        dur = timedelta(seconds=_safe_int(row["DurationSec"], 0))
-        if d in prev_end_by_day:
-            st_dt = prev_end_by_day[d] + GAP
-        en_dt = st_dt + dur
-        prev_end_by_day[d] = en_dt
-        starts.append(st_dt); ends.append(en_dt)
-
-    base["Start"] = starts
-    base["End"] = ends
+    # um único parse de "Date Start" (strings já normalizadas); a data sai do próprio resultado
+    start_local = parse_local_datetimes(base["Date"] + " " + base["Start"])
+    base["Date"] = start_local.dt.date
+    base = base[start_local.notna()]
+    # fuso fixo: local -> UTC é só subtrair o offset no int64 ns, sem tz_localize
+    start_ns = _as_ns(start_local[base.index]) - OFFSET_NS
+
+    # o início já carrega a data: um argsort estável no int64 ns substitui o sort por (Date, início)
+    order = np.argsort(start_ns, kind="stable")
+    base = base.iloc[order].reset_index(drop=True)
+    start_ns = start_ns[order]
+
+    # encadeamento vetorizado: dentro de cada data, Start_i = Start_0 + Σ_{j<i} (dur_j + GAP)
+    dur_ns = base["DurationSec"].to_numpy(np.int64) * NS
+    step = pd.Series(dur_ns + int(GAP.total_seconds()) * NS, index=base.index)
+    first_ns = pd.Series(start_ns, index=base.index).groupby(base["Date"], sort=False).transform("first")
+    starts_ns = (first_ns + step.groupby(base["Date"], sort=False).cumsum() - step).to_numpy(np.int64)
+
+    base["Start"] = pd.to_datetime(starts_ns, utc=True).tz_convert(TZINFO)
+    base["End"] = pd.to_datetime(starts_ns + dur_ns, utc=True).tz_convert(TZINFO)
     return base[["Date","Start","End","DurationSec","Activity"]]
 
-def persist_chained_back(df_raw_like_list: list[dict]) -> None:
+def persist_chained_back(tasks: dict[str, list]) -> None:
     """
     Reencadeia e grava de volta no session_state.tasks, com Start já recalculado (HH:MM:SS).
     """
-    base = pd.DataFrame(df_raw_like_list)
-    sched = compute_schedule(base)
-    # grava formatado
-    st.session_state.tasks = [{
-        "Date": d.isoformat(),
-        "Start": s.strftime("%H:%M:%S"),
-        "DurationSec": int(dur),
-        "Activity": act,
-    } for d, s, dur, act in zip(
-        sched["Date"],
-        sched["Start"].dt.tz_convert(TZINFO).dt.to_pydatetime(),
-        sched["DurationSec"],
-        sched["Activity"],
-    )]
+    sched = compute_schedule(pd.DataFrame(tasks))
+    # grava formatado, coluna a coluna
+    st.session_state.tasks = {
+        "Date": [d.isoformat() for d in sched["Date"]],
+        "Start": sched["Start"].dt.strftime("%H:%M:%S").tolist() if not sched.empty else [],
+        "DurationSec": [int(x) for x in sched["DurationSec"]],
+        "Activity": sched["Activity"].tolist(),
+    }
+    st.session_state.tasks_version += 1
+    # já deixa pronta a visão de exibição para os próximos ticks
+    _store_view(build_view(sched), st.session_state.tasks_version)
+
+def build_view(sched: pd.DataFrame) -> pd.DataFrame:
+    """Acrescenta as colunas de exibição, que não dependem de `now`: Data, Início, Fim, Duração."""
+    if sched.empty:
+        return sched.reindex(columns=list(sched.columns) + ["Data","Início","Fim","Duração"])
+    # cópia rasa: só acrescentamos colunas novas, os arrays de sched não são tocados
+    view = sched.copy(deep=False)
+    # um strftime por coluna de origem; Data/Início saem fatiando a mesma string
+    start_txt = view["Start"].dt.strftime("%d/%m/%Y %H:%M:%S")
+    view["Data"]      = start_txt.str[:10]
+    view["Início"]    = start_txt.str[11:]
+    view["Fim"]       = view["End"].dt.strftime("%H:%M:%S")
+    view["Duração"]   = durations_to_hms(view["DurationSec"])
+    return view
+
+def schedule_view() -> pd.DataFrame:
+    """
+    Visão encadeada e formatada, guardada no session_state.
+    Só é refeita quando as tarefas mudam; a cada tick resta apenas classificar o Status.
+    """
+    key = st.session_state.tasks_version
+    if st.session_state.get("view_key") != key:
+        _store_view(build_view(compute_schedule(pd.DataFrame(st.session_state.tasks))), key)
+    return st.session_state.view
+
+def _as_ns(col: pd.Series) -> np.ndarray:
+    return np.asarray(col.values, dtype="datetime64[ns]").view(np.int64)
+
+def _store_view(view: pd.DataFrame, key: int) -> None:
+    """
+    Guarda a visão e, em paralelo (SoA), Start/End como arrays int64 em ns UTC.
+    A visão sai ordenada pelo início digitado, mas o encadeamento é por data: a cadeia de um dia
+    pode passar da meia-noite e invadir o primeiro início do dia seguinte. `monotonic` registra,
+    uma vez por mudança de tarefas, se os intervalos estão em ordem e sem sobreposição (caso em
+    que a busca binária de locate_now vale); senão o painel classifica por máscaras.
+    """
+    start_ns, end_ns = _as_ns(view["Start"]), _as_ns(view["End"])
+    st.session_state.view = view
+    st.session_state.view_key = key
+    st.session_state.start_ns = start_ns
+    st.session_state.end_ns = end_ns
+    st.session_state.monotonic = bool(np.all(end_ns[:-1] < start_ns[1:]))
 
 # ---------------- Estado ----------------
 ensure_state()
@@ -250,23 +383,23 @@ with st.expander("»»", expanded=False):
             elif dur is None:
                 st.error("Use o formato MM:SS em **Duração** (ex.: 05:30).")
             else:
-                new_list = list(st.session_state.tasks) + [{
-                    "Date": d.isoformat(),
-                    "Start": t_start.strftime("%H:%M:%S"),
-                    "DurationSec": int(dur.total_seconds()),
-                    "Activity": activity.strip(),
-                }]
-                persist_chained_back(new_list)   # <- SALVA REENCadeado
+                cur = st.session_state.tasks
+                persist_chained_back({
+                    "Date": cur["Date"] + [d.isoformat()],
+                    "Start": cur["Start"] + [t_start.strftime("%H:%M:%S")],
+                    "DurationSec": cur["DurationSec"] + [int(dur.total_seconds())],
+                    "Activity": cur["Activity"] + [activity.strip()],
+                })   # <- SALVA REENCadeado
                 st.success("Atividade adicionada e reencadeada.")
                 st.rerun()
 
 # ---- Editar atividades (expander) ----
 with st.expander("»»", expanded=False):
-    if not st.session_state.tasks:
+    if not task_count():
         st.info("Nenhuma atividade para editar ainda.")
     else:
         raw = normalize_tasks(pd.DataFrame(st.session_state.tasks)).reset_index().rename(columns={"index":"ID"})
-        raw["Duration"] = raw["DurationSec"].apply(lambda s: duration_to_hms(timedelta(seconds=int(s))))
+        raw["Duration"] = durations_to_hms(raw["DurationSec"])
 
         edited = st.data_editor(
             raw[["ID","Date","Start","Duration","Activity"]],
@@ -298,34 +431,7 @@ with st.expander("»»", expanded=False):
                 st.warning("ID não encontrado na tabela acima.")
 
         if do_save:
-            new_tasks: list[dict] = []
-            errors: list[str] = []
-            for i, r in edited.iterrows():
-                date_str = str(r.get("Date","")).strip()
-                start_str = str(r.get("Start","")).strip()
-                dur_str   = str(r.get("Duration","")).strip()
-                act       = str(r.get("Activity","")).strip()
-
-                if not (date_str and start_str and dur_str and act):
-                    errors.append(f"Linha {i}: campos vazios."); continue
-                try:
-                    d_parsed = datetime.fromisoformat(date_str).date()
-                except ValueError:
-                    errors.append(f"Linha {i}: Date inválida (use YYYY-MM-DD)."); continue
-                t_start = parse_time_str(start_str)
-                if t_start is None:
-                    errors.append(f"Linha {i}: Início inválido (use HH:MM:SS)."); continue
-                dur = parse_duration_hms(dur_str)
-                if dur is None:
-                    errors.append(f"Linha {i}: Duração inválida (use HH:MM:SS ou MM:SS)."); continue
-
-                new_tasks.append({
-                    "Date": d_parsed.isoformat(),
-                    "Start": t_start.strftime("%H:%M:%S"),
-                    "DurationSec": int(dur.total_seconds()),
-                    "Activity": act,
-                })
-
+            new_tasks, errors = validate_edited_rows(edited)
             if errors:
                 st.error("Não foi possível salvar por causa de erros:\n- " + "\n- ".join(errors))
             else:
@@ -333,51 +439,67 @@ with st.expander("»»", expanded=False):
                 st.success("Alterações salvas e atividades reencadeadas.")
                 st.rerun()
 
-# ---- KPIs + barra ----
-if st.session_state.tasks:
-    base_df = normalize_tasks(pd.DataFrame(st.session_state.tasks))
-    sched = compute_schedule(base_df)
+# ---- Painel ao vivo: só este fragmento é re-executado a cada 1s ----
+@st.fragment(run_every=1)
+def live_panel():
+    if not task_count():
+        st.info("Sem atividades cadastradas.")
+        return
 
+    base = schedule_view()
+    # tudo em ns UTC desde a época: comparações e contagens sem nenhuma conta de fuso
+    start_ns, end_ns = st.session_state.start_ns, st.session_state.end_ns
     now = now_br()
-    view = sched.copy()
-    view["Data"]      = view["Start"].dt.strftime("%d/%m/%Y")
-    view["Início"]    = view["Start"].dt.strftime("%H:%M:%S")
-    view["Fim"]       = view["End"].dt.strftime("%H:%M:%S")
-    view["Duração"]   = view["DurationSec"].apply(lambda s: duration_to_hms(timedelta(seconds=int(s))))
-    view = classify_rows(view, now)
-
-    running = view[view["Status"] == STATUS_RUNNING]
-    next_up = view[view["Status"] == STATUS_NEXT]
-    current_row = running.iloc[0] if not running.empty else None
-    next_row = next_up.iloc[0] if not next_up.empty else None
-
-    k1, k2, k3, k4 = st.columns(4)
-    k1.metric("Agora (Brasília)", now.strftime("%d/%m %H:%M:%S"))
-    k2.metric("⏱️ Tempo p/ acabar", human_td(current_row["End"] - now) if current_row is not None else "—")
-    k3.metric("🕒 Tempo p/ próxima", human_td(next_row["Start"] - now) if next_row is not None else "—")
-    k4.metric("Atividades concluídas", f"{int((view['Status']==STATUS_DONE).sum())}/{len(view)}")
-
+    now_ns = int(now.timestamp() * NS)
+    if st.session_state.monotonic:
+        # linhas ordenadas: a busca binária dá atual/próxima e já é a contagem de concluídas (i_done)
+        i_done, i_next = locate_now(start_ns, end_ns, now_ns)
+        done, running, i_upcoming = slice(0, i_done), slice(i_done, i_next), i_next
+        n_done = i_done
+        status_key = (i_done, i_next)
+    else:
+        # intervalos sobrepostos: máscaras int64 sobre todos os arrays
+        done, running, i_upcoming = status_masks(start_ns, end_ns, now_ns)
+        n_done = int(done.sum())
+        status_key = (done.tobytes(), running.tobytes())
+    # atual/próxima saem dos mesmos seletores da tabela (fatia ou máscara)
+    if isinstance(running, slice):
+        i_cur = running.start if running.start < running.stop else None
+    else:
+        i_cur = int(np.argmax(running)) if running.any() else None
+
+    # ---- KPIs + barra ----
+    current_row = base.iloc[i_cur] if i_cur is not None else None
+    next_row = base.iloc[i_upcoming] if i_upcoming < len(base) else None
+
+    # um único strftime por tick; as contagens regressivas saem direto dos segundos inteiros
+    now_str = now.strftime("%d/%m %H:%M:%S")
+    kpis = [
+        ("Agora (Brasília)", now_str),
+        ("⏱️ Tempo p/ acabar", human_secs((end_ns[i_cur] - now_ns) // NS) if current_row is not None else "—"),
+        ("🕒 Tempo p/ próxima", human_secs((start_ns[i_upcoming] - now_ns) // NS) if next_row is not None else "—"),
+        ("Atividades concluídas", f"{n_done}/{len(base)}"),
+    ]
+    for col, (label, value) in zip(st.columns(len(kpis)), kpis):
+        col.metric(label, value)
+
+    # slot fixo para a barra: com ou sem atividade em execução, a árvore de elementos do
+    # fragmento tem a mesma forma e a tabela abaixo é atualizada no lugar a cada tick
+    progress_slot = st.empty()
     if current_row is not None:
-        total_secs = (current_row["End"] - current_row["Start"]).total_seconds()
-        elapsed = (now - current_row["Start"]).total_seconds()
-        pct = max(0.0, min(1.0, elapsed / total_secs)) if total_secs > 0 else 0.0
-        st.progress(pct, text=f"Em execução: {current_row['Activity']} ({int(pct*100)}%)")
-
-# ---- Tabela (painel rolável) ----
-if not st.session_state.tasks:
-    st.info("Sem atividades cadastradas.")
-else:
-    base_df = normalize_tasks(pd.DataFrame(st.session_state.tasks))
-    sched = compute_schedule(base_df)
-    sched["Data"]      = sched["Start"].dt.strftime("%d/%m/%Y")
-    sched["Início"]    = sched["Start"].dt.strftime("%H:%M:%S")
-    sched["Fim"]       = sched["End"].dt.strftime("%H:%M:%S")
-    sched["Duração"]   = sched["DurationSec"].apply(lambda s: duration_to_hms(timedelta(seconds=int(s))))
-    sched = classify_rows(sched, now_br())
-
-    html_table = style_table(sched)
-    st.markdown(f'<div class="btz-table-panel">{html_table}</div>', unsafe_allow_html=True)
-
-# ---- Auto-refresh 1s ----
-time.sleep(1.0)
-st.rerun()
+        total_ns = int(end_ns[i_cur] - start_ns[i_cur])
+        elapsed_ns = now_ns - int(start_ns[i_cur])
+        pct = max(0.0, min(1.0, elapsed_ns / total_ns)) if total_ns > 0 else 0.0
+        progress_slot.progress(pct, text=f"Em execução: {current_row['Activity']} ({int(pct*100)}%)")
+
+    # ---- Tabela (painel rolável) ----
+    # o Status só muda quando um limite é cruzado ou as tarefas mudam;
+    # fora disso o tick reaproveita o HTML já montado, sem classificar nem varrer linhas
+    table_key = (st.session_state.tasks_version, status_key)
+    if st.session_state.get("table_key") != table_key:
+        view = classify_rows(base.copy(deep=False), done, running, i_upcoming)
+        st.session_state.table_html = style_table(view)
+        st.session_state.table_key = table_key
+    st.markdown(f'<div class="btz-table-panel">{st.session_state.table_html}</div>', unsafe_allow_html=True)
+
+live_panel()